@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PriorityClass:
+    """
+    Concurrency limit and bounded wait queue for one class of routes
+    Lower priority number means more important traffic
+    """
+
+    def __init__(self, name: str, priority: int, max_concurrent: int, max_queued: int,
+                 queue_timeout: float, retry_after: int):
+        self.name = name
+        self.priority = priority
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self.active = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+
+        # Counters exposed through stats()
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.shed_total = 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, higher_priority_waiting: bool) -> bool:
+        """
+        Take a slot, queueing if the class is full; returns False if the request should be shed
+        """
+        # Back off entirely while more important traffic is already queueing
+        if higher_priority_waiting:
+            self.shed_total += 1
+            return False
+
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.admitted_total += 1
+            return True
+
+        if len(self._waiters) >= self.max_queued:
+            self.shed_total += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued_total += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            client_gone = isinstance(e, asyncio.CancelledError)
+            if waiter.done():
+                # The slot was handed over right as we gave up waiting
+                if client_gone:
+                    self.release()
+                    raise
+                self.admitted_total += 1
+                return True
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            if client_gone:
+                raise
+            self.shed_total += 1
+            return False
+
+        self.admitted_total += 1
+        return True
+
+    def release(self):
+        # Hand the slot straight to the next waiter so queued requests are served in order
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "priority": self.priority,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "active": self.active,
+            "queued": self.waiting,
+            "admitted_total": self.admitted_total,
+            "queued_total": self.queued_total,
+            "shed_total": self.shed_total
+        }
+
+
+class AdmissionController:
+    """
+    Maps request paths to priority classes so admin scans cannot starve license checks
+    """
+
+    def __init__(self, classes: List[PriorityClass], routes: List[Tuple[str, str]]):
+        self.classes = {priority_class.name: priority_class for priority_class in classes}
+        # (path prefix, class name), checked in order
+        self.routes = routes
+
+    def classify(self, path: str) -> Optional[PriorityClass]:
+        for prefix, class_name in self.routes:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return self.classes[class_name]
+        return None
+
+    def higher_priority_waiting(self, priority_class: PriorityClass) -> bool:
+        return any(
+            other.priority < priority_class.priority and other.waiting > 0
+            for other in self.classes.values()
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: priority_class.stats() for name, priority_class in self.classes.items()}
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that queues or sheds requests (429 with Retry-After) per priority class
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        priority_class = self.controller.classify(scope["path"])
+        if priority_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        admitted = await priority_class.acquire(self.controller.higher_priority_waiting(priority_class))
+        if not admitted:
+            logger.warning(f"Shedding {scope['path']} request ({priority_class.name} class over capacity)")
+            await self._send_overloaded(send, priority_class)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            priority_class.release()
+
+    @staticmethod
+    async def _send_overloaded(send, priority_class: PriorityClass):
+        body = json.dumps({
+            "detail": f"Server is busy handling {priority_class.name} requests. Please retry later."
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(priority_class.retry_after).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+
+class IdempotencyStore:
+    """
+    Bounded, expiring store of recent responses keyed by Idempotency-Key header
+    Lets clients retry a request without the server repeating its side effects
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: int = 24 * 60 * 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        # Keys whose original request is still running, never evicted so waiters always get woken up
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(payload: Dict[str, Any]) -> str:
+        """
+        Stable hash of the request payload so a reused key with different data can be detected
+        """
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _purge_expired(self, now: float):
+        # Entries are kept in insertion order, so expired ones are always at the front
+        while self._entries:
+            oldest_key = next(iter(self._entries))
+            stored_at = self._entries[oldest_key][0]
+            if now - stored_at < self.ttl_seconds:
+                break
+            del self._entries[oldest_key]
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Reserve key for this request, returns None if the caller now owns it
+        The caller must then call complete() or release()
+        If key already has a response it is returned; if the original request is still running,
+        this waits for it and returns its response
+        Raises ValueError if key was previously used with a different payload
+        """
+        while True:
+            with self._lock:
+                self._purge_expired(time.monotonic())
+                entry = self._entries.get(key)
+                if entry is not None:
+                    _, stored_fingerprint, response = entry
+                    if stored_fingerprint != fingerprint:
+                        raise ValueError("Idempotency-Key has already been used with a different request payload")
+                    return response
+
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = (fingerprint, asyncio.get_running_loop().create_future())
+                    return None
+
+                pending_fingerprint, pending_future = pending
+                if pending_fingerprint != fingerprint:
+                    raise ValueError("Idempotency-Key has already been used with a different request payload")
+
+            # Resolves with the response, or None if the original request failed and released the key
+            response = await asyncio.shield(pending_future)
+            if response is not None:
+                return response
+
+    def complete(self, key: str, fingerprint: str, response: Dict[str, Any]):
+        """
+        Store the response for a claimed key and wake up any requests waiting on it
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._purge_expired(now)
+            self._entries.pop(key, None)
+            self._entries[key] = (now, fingerprint, response)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            pending = self._pending.pop(key, None)
+
+        if pending is not None and not pending[1].done():
+            pending[1].set_result(response)
+
+    def release(self, key: str):
+        """
+        Drop the claim on key after a failed request so the client can retry it
+        """
+        with self._lock:
+            pending = self._pending.pop(key, None)
+
+        if pending is not None and not pending[1].done():
+            pending[1].set_result(None)
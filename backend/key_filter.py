@@ -0,0 +1,46 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Probabilistic set of activation keys
+    might_contain() can return false positives but never false negatives
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float = 0.01):
+        self.capacity = max(capacity, 1)
+        self.false_positive_rate = false_positive_rate
+
+        # Standard sizing: m = -n ln(p) / (ln 2)^2 bits and k = (m / n) ln 2 hash functions
+        self.num_bits = max(8, int(-self.capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Double hashing: derive all k positions from two 64-bit halves of one digest
+        digest = hashlib.sha256(key.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> bool:
+        """
+        Add key, returns False if it was already (or appears to be) present
+        Repeat adds don't count toward capacity, so refreshing the same keys never fills the filter
+        """
+        if self.might_contain(key):
+            return False
+
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+        return True
+
+    def might_contain(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def is_over_capacity(self) -> bool:
+        return self.count > self.capacity
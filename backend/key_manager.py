@@ -1,13 +1,140 @@
 import secrets
 import hashlib
 import string
-from datetime import datetime, timedelta
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from firebase_config import db
+from firebase_admin import firestore
 from typing import Optional, Dict, Any
+from key_filter import BloomFilter
+
+# Keys generated with a trailing checksum group, e.g. 1A2B-3C4D-5E6F-7A8B-9C0D
+CHECKSUMMED_KEY_PATTERN = re.compile(r"^([0-9A-F]{4})-([0-9A-F]{4})-([0-9A-F]{4})-([0-9A-F]{4})-([0-9A-F]{4})$")
+
+# Lower bound for "changed since" queries once every written record carries updated_at
+UPDATED_AT_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# How often the key filter picks up keys written by other servers, off the request path
+KEY_FILTER_REFRESH_SECONDS = 10
 
 class ActivationKeyManager:
     def __init__(self):
         self.collection_name = "activation_keys"
+        
+        # In-memory membership filter of existing keys, None until built
+        self.key_filter: Optional[BloomFilter] = None
+        self._key_filter_lock = threading.Lock()
+        self._key_filter_watermark: Optional[datetime] = None
+        self._keys_added_during_rebuild: Optional[set] = None
+        self._key_filter_thread: Optional[threading.Thread] = None
+    
+    @staticmethod
+    def key_checksum(raw_key: str) -> str:
+        """
+        Checksum group appended to newly generated keys
+        """
+        return hashlib.sha256(raw_key.encode()).hexdigest()[:4].upper()
+    
+    @classmethod
+    def has_invalid_checksum(cls, activation_key: str) -> bool:
+        """
+        True if the key has the checksummed shape but its checksum does not match
+        Older keys without a checksum group are never reported as invalid here
+        """
+        match = CHECKSUMMED_KEY_PATTERN.match(activation_key)
+        if not match:
+            return False
+        
+        raw_key = "".join(match.groups()[:4])
+        return cls.key_checksum(raw_key) != match.group(5)
+    
+    def rebuild_key_filter(self) -> bool:
+        """
+        Build the membership filter from every activation key in the store
+        """
+        with self._key_filter_lock:
+            if self._keys_added_during_rebuild is not None:
+                # Another rebuild is already running
+                return False
+            self._keys_added_during_rebuild = set()
+        
+        # Only document IDs and updated_at are needed, not whole records
+        activations = self.get_activations_changed_since(None, fields=["updated_at"])
+        if activations is None:
+            with self._key_filter_lock:
+                self._keys_added_during_rebuild = None
+            return False
+        
+        # Leave headroom so the filter keeps its false positive rate as new keys are added
+        new_filter = BloomFilter(capacity=max(len(activations) * 2, 10000))
+        for record in activations:
+            new_filter.add(record["activation_key"])
+        
+        with self._key_filter_lock:
+            # Keys stored while the collection was being read may be missing from the snapshot
+            for activation_key in self._keys_added_during_rebuild:
+                new_filter.add(activation_key)
+            self._keys_added_during_rebuild = None
+            self.key_filter = new_filter
+            self._key_filter_watermark = self.latest_updated_at(activations)
+        
+        print(f"Activation key filter built with {len(activations)} key(s)")
+        return True
+    
+    def refresh_key_filter(self) -> bool:
+        """
+        Add keys written by any server since the filter watermark, rebuilding if the filter is missing or full
+        """
+        if self.key_filter is None or self.key_filter.is_over_capacity():
+            return self.rebuild_key_filter()
+        
+        # Records written before updated_at existed are already in the filter from the full rebuild
+        since = self._key_filter_watermark or UPDATED_AT_EPOCH
+        changed = self.get_activations_changed_since(since, fields=["updated_at"])
+        if changed is None:
+            return False
+        
+        for record in changed:
+            self._add_to_key_filter(record["activation_key"])
+        
+        with self._key_filter_lock:
+            self._key_filter_watermark = self.latest_updated_at(changed, self._key_filter_watermark)
+        return True
+    
+    def start_key_filter_refresher(self, interval: float = KEY_FILTER_REFRESH_SECONDS):
+        """
+        Build the key filter in a background thread, then keep refreshing it every interval seconds
+        """
+        if self._key_filter_thread and self._key_filter_thread.is_alive():
+            return
+        
+        def refresh_forever():
+            while True:
+                try:
+                    self.refresh_key_filter()
+                except Exception as e:
+                    print(f"Error refreshing activation key filter: {e}")
+                time.sleep(interval)
+        
+        self._key_filter_thread = threading.Thread(target=refresh_forever, name="key-filter-refresher", daemon=True)
+        self._key_filter_thread.start()
+    
+    def _add_to_key_filter(self, activation_key: str):
+        with self._key_filter_lock:
+            if self._keys_added_during_rebuild is not None:
+                self._keys_added_during_rebuild.add(activation_key)
+            if self.key_filter is not None:
+                self.key_filter.add(activation_key)
+    
+    def might_exist(self, activation_key: str) -> bool:
+        """
+        False if the key is not in the store as of the last filter refresh, answered from memory
+        Keys written by another server become visible within KEY_FILTER_REFRESH_SECONDS
+        """
+        return self.key_filter is None or self.key_filter.might_contain(activation_key)
+
     
     def generate_activation_key(self, system_id: str, app_name: str = "wa-bomb") -> str:
         """
@@ -31,7 +158,10 @@ class ActivationKeyManager:
         # Convert to uppercase alphanumeric key (similar to your existing format)
         # Take first 16 characters and format with dashes
         raw_key = hex_hash[:16].upper()
-        formatted_key = "-".join([raw_key[i:i+4] for i in range(0, len(raw_key), 4)])
+        key_groups = [raw_key[i:i+4] for i in range(0, len(raw_key), 4)]
+        
+        # Append a checksum group so mistyped keys can be rejected without a database read
+        formatted_key = "-".join(key_groups + [self.key_checksum(raw_key)])
         
         return formatted_key
     
@@ -60,9 +190,13 @@ class ActivationKeyManager:
                 "expires_at": expiry_date,
                 "is_active": True,
                 "app_name": app_name,
-                "validity_days": validity_days  # Store the original validity setting
+                "validity_days": validity_days,  # Store the original validity setting
+                "updated_at": firestore.SERVER_TIMESTAMP  # Sync watermark for local caches
             }
             
+            # Add to the filter before writing so the key can never be filtered out once it exists
+            self._add_to_key_filter(activation_key)
+            
             # Store in Firestore using activation_key as document ID
             doc_ref = db.collection(self.collection_name).document(activation_key)
             doc_ref.set(activation_record)
@@ -85,6 +219,14 @@ class ActivationKeyManager:
                     "expired": False
                 }
             
+            # Reject mistyped keys and keys that definitely don't exist without a database read
+            if self.has_invalid_checksum(activation_key) or not self.might_exist(activation_key):
+                return {
+                    "valid": False,
+                    "message": "Invalid activation key",
+                    "expired": False
+                }
+            
             # Get document by activation key
             doc_ref = db.collection(self.collection_name).document(activation_key)
             doc = doc_ref.get()
@@ -172,6 +314,69 @@ class ActivationKeyManager:
             print(f"Error getting activations: {e}")
             return []
     
+    @staticmethod
+    def latest_updated_at(records: list, watermark: Optional[datetime] = None) -> Optional[datetime]:
+        """
+        Advance a sync watermark to the newest server-assigned updated_at among records
+        Records written before updated_at existed don't move it, so it stays None until one is seen
+        """
+        for record in records:
+            updated_at = record.get("updated_at")
+            if isinstance(updated_at, datetime) and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+        return watermark
+    
+    def get_activations_changed_since(self, since: Optional[datetime] = None,
+                                      fields: Optional[list] = None) -> Optional[list]:
+        """
+        Get activation records whose updated_at is at or after since (all records if since is None)
+        If fields is given only those fields are fetched, activation_key is always included
+        Returns None on failure so callers can tell an error apart from "nothing changed"
+        """
+        try:
+            if not db:
+                return None
+            
+            query = db.collection(self.collection_name)
+            if since is not None:
+                query = query.where("updated_at", ">=", since)
+            if fields is not None:
+                query = query.select(fields)
+            
+            activations = []
+            for doc in query.stream():
+                data = doc.to_dict()
+                data['activation_key'] = doc.id
+                activations.append(data)
+            
+            return activations
+            
+        except Exception as e:
+            print(f"Error getting changed activations: {e}")
+            return None
+    
+    def backfill_updated_at(self, activation_keys: list) -> bool:
+        """
+        Stamp updated_at on records written before it existed so delta syncs can skip them
+        """
+        try:
+            if not db:
+                return False
+            
+            # Firestore batches are limited to 500 writes
+            for start in range(0, len(activation_keys), 500):
+                batch = db.batch()
+                for activation_key in activation_keys[start:start + 500]:
+                    doc_ref = db.collection(self.collection_name).document(activation_key)
+                    batch.update(doc_ref, {"updated_at": firestore.SERVER_TIMESTAMP})
+                batch.commit()
+            
+            return True
+            
+        except Exception as e:
+            print(f"Error backfilling updated_at: {e}")
+            return False
+    
     def deactivate_key(self, activation_key: str) -> bool:
         """
         Deactivate an activation key
@@ -181,7 +386,7 @@ class ActivationKeyManager:
                 return False
             
             doc_ref = db.collection(self.collection_name).document(activation_key)
-            doc_ref.update({"is_active": False})
+            doc_ref.update({"is_active": False, "updated_at": firestore.SERVER_TIMESTAMP})
             
             return True
             
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".key-gen-app", "activations_cache.json")
+
+
+class LocalActivationCache:
+    """
+    On-disk snapshot of activation records plus an updated_at sync watermark
+    Lets the admin list be served from disk at startup and refreshed with only the records that changed
+    """
+
+    def __init__(self, key_manager, cache_path: str = DEFAULT_CACHE_PATH):
+        self.key_manager = key_manager
+        self.cache_path = cache_path
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.watermark: Optional[datetime] = None
+        self.last_synced_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._sync_thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _to_json_safe(record: Dict[str, Any]) -> Dict[str, Any]:
+        # Firestore timestamps become ISO strings, the same shape the API already returns
+        return json.loads(json.dumps(record, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value)))
+
+    def load(self) -> bool:
+        """
+        Load the snapshot from disk, returns False if there is no usable snapshot
+        """
+        try:
+            if not os.path.exists(self.cache_path):
+                return False
+
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+
+            watermark = snapshot.get("watermark")
+            with self._lock:
+                self.records = snapshot.get("records", {})
+                self.watermark = datetime.fromisoformat(watermark) if watermark else None
+
+            logger.info(f"Loaded {len(self.records)} activation record(s) from local cache")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error loading local activation cache: {e}")
+            return False
+
+    def _save(self):
+        with self._lock:
+            snapshot = {
+                "watermark": self.watermark.isoformat() if self.watermark else None,
+                "records": self.records
+            }
+
+        # Write to a temp file first so a crash never leaves a half-written snapshot
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = f"{self.cache_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, self.cache_path)
+
+    def sync(self) -> bool:
+        """
+        Fetch records changed since the watermark (everything on first sync) and merge them into the snapshot
+        """
+        with self._sync_lock:
+            changed = self.key_manager.get_activations_changed_since(self.watermark)
+            if changed is None:
+                return False
+
+            # Records from before updated_at existed would force a full scan on every sync, so stamp them once
+            legacy_keys = [record["activation_key"] for record in changed if "updated_at" not in record]
+            if legacy_keys:
+                self.key_manager.backfill_updated_at(legacy_keys)
+
+            with self._lock:
+                modified = 0
+                for record in changed:
+                    record = self._to_json_safe(record)
+                    if self.records.get(record["activation_key"]) != record:
+                        self.records[record["activation_key"]] = record
+                        modified += 1
+
+                # Stays None until a record carries a server updated_at, the local clock is never used
+                watermark = self.key_manager.latest_updated_at(changed, self.watermark)
+                watermark_moved = watermark != self.watermark
+                self.watermark = watermark
+                self.last_synced_at = datetime.now(timezone.utc)
+
+            if modified or watermark_moved:
+                try:
+                    self._save()
+                except Exception as e:
+                    logger.error(f"Error saving local activation cache: {e}")
+
+            if modified:
+                logger.info(f"Synced {modified} changed activation record(s) into local cache")
+            return True
+
+    def record_local_change(self, activation_key: str, fields: Dict[str, Any]):
+        """
+        Merge a change made by this server into the snapshot so the admin list shows it before the next sync
+        The watermark is left alone, so the next sync still fetches the stored record
+        """
+        with self._lock:
+            record = dict(self.records.get(activation_key, {}))
+            record.update(self._to_json_safe(fields))
+            record["activation_key"] = activation_key
+            self.records[activation_key] = record
+
+    def start_background_sync(self):
+        """
+        Run sync in a background thread unless one is already running
+        """
+        if self._sync_thread and self._sync_thread.is_alive():
+            return
+
+        self._sync_thread = threading.Thread(target=self.sync, name="activation-cache-sync", daemon=True)
+        self._sync_thread.start()
+
+    def is_syncing(self) -> bool:
+        return self._sync_thread is not None and self._sync_thread.is_alive()
+
+    def get_activations(self) -> list:
+        with self._lock:
+            return list(self.records.values())
@@ -1,12 +1,17 @@
-from fastapi import FastAPI, HTTPException, Form
+from fastapi import FastAPI, HTTPException, Form, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 import uvicorn
 from key_manager import ActivationKeyManager
+from idempotency import IdempotencyStore
+from admission import AdmissionController, AdmissionMiddleware, PriorityClass
+from local_cache import LocalActivationCache, DEFAULT_CACHE_PATH
 from firebase_config import get_firebase_status, db
 import logging
+import os
 
 # Configure logging
 logging.basicConfig(
@@ -17,6 +22,27 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Multi-App Activation Key Manager", version="1.0.0")
 
+# Admission control: per-route concurrency limits and priority classes
+# License verification is served first; admin scans are queued briefly and shed (429) when busy
+admission_controller = AdmissionController(
+    classes=[
+        PriorityClass("verification", priority=0, max_concurrent=32, max_queued=256, queue_timeout=5.0, retry_after=1),
+        PriorityClass("write", priority=1, max_concurrent=8, max_queued=32, queue_timeout=10.0, retry_after=2),
+        PriorityClass("admin", priority=2, max_concurrent=2, max_queued=4, queue_timeout=2.0, retry_after=5),
+    ],
+    routes=[
+        ("/verify-key", "verification"),
+        ("/generate-key", "write"),
+        ("/deactivate-key", "write"),
+        ("/get-all-keys", "admin"),
+        ("/customer-stats", "admin"),
+        ("/test-firebase", "admin"),
+    ]
+)
+
+# Added before CORS so that 429 responses still carry CORS headers
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, specify exact origins
@@ -47,6 +73,26 @@ except Exception as e:
     logger.error(f"❌ Failed to initialize key manager: {str(e)}")
     key_manager = None
 
+# Build the in-memory filter of existing keys and keep it refreshed in the background
+# Verification reads the store until the filter is ready
+if key_manager and db:
+    key_manager.start_key_filter_refresher()
+
+# Local on-disk snapshot of activation records for the admin list
+# Served straight from disk at startup while changes since the last watermark are fetched in the background
+activation_cache = None
+if key_manager:
+    activation_cache = LocalActivationCache(
+        key_manager,
+        cache_path=os.environ.get("ACTIVATION_CACHE_PATH", DEFAULT_CACHE_PATH)
+    )
+    activation_cache.load()
+    if db:
+        activation_cache.start_background_sync()
+
+# Recent /generate-key responses, so client retries return the original key
+idempotency_store = IdempotencyStore()
+
 class GenerateKeyRequest(BaseModel):
     system_id: str
     app_name: str  # "wa-bomb" or "mail-storm"
@@ -76,10 +122,14 @@ async def root():
     }
 
 @app.post("/generate-key")
-async def generate_activation_key(request: GenerateKeyRequest):
+async def generate_activation_key(request: GenerateKeyRequest,
+                                  idempotency_key: Optional[str] = Header(None)):
     """
     Generate a new activation key for a system ID
+    Retries sending the same Idempotency-Key header get the original response back
     """
+    # Set once this request owns the Idempotency-Key, released in finally if it never completes
+    claimed_idempotency_key = None
     try:
         # Check Firebase connection first
         if not db:
@@ -94,6 +144,20 @@ async def generate_activation_key(request: GenerateKeyRequest):
                 detail="Key manager is not initialized. Server configuration error."
             )
         
+        # Replay the stored response for a retried request instead of creating another key
+        if idempotency_key:
+            request_fingerprint = IdempotencyStore.fingerprint(request.dict())
+            try:
+                # Waits for the original request if it is still running
+                cached_response = await idempotency_store.claim(idempotency_key, request_fingerprint)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            
+            if cached_response is not None:
+                logger.info(f"Returning stored response for Idempotency-Key {idempotency_key}")
+                return cached_response
+            claimed_idempotency_key = idempotency_key
+        
         # Generate activation key using only system_id and app_name
         # SHA-256 for wa-bomb, SHA-512 for mail-storm
         activation_key = key_manager.generate_activation_key(
@@ -101,8 +165,9 @@ async def generate_activation_key(request: GenerateKeyRequest):
             app_name=request.app_name
         )
         
-        # Store in database
-        success = key_manager.store_activation_record(
+        # Store in database off the event loop; the idempotency claim above covers retries arriving meanwhile
+        success = await run_in_threadpool(
+            key_manager.store_activation_record,
             system_id=request.system_id,
             activation_key=activation_key,
             app_name=request.app_name,
@@ -117,7 +182,7 @@ async def generate_activation_key(request: GenerateKeyRequest):
         
         validity_message = "lifetime" if request.validity_days is None else f"{request.validity_days} days"
         
-        return {
+        response = {
             "success": True,
             "activation_key": activation_key,
             "system_id": request.system_id,
@@ -130,11 +195,32 @@ async def generate_activation_key(request: GenerateKeyRequest):
             "message": f"Activation key generated successfully for {request.app_name} with {validity_message} validity"
         }
         
+        if activation_cache:
+            activation_cache.record_local_change(activation_key, {
+                "system_id": request.system_id,
+                "app_name": request.app_name,
+                "customer_name": request.customer_name,
+                "customer_mobile": request.customer_mobile,
+                "customer_email": request.customer_email,
+                "validity_days": request.validity_days,
+                "is_active": True
+            })
+        
+        if claimed_idempotency_key:
+            idempotency_store.complete(claimed_idempotency_key, request_fingerprint, response)
+            claimed_idempotency_key = None
+        
+        return response
+        
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error generating key: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating key: {str(e)}")
+    finally:
+        if claimed_idempotency_key:
+            # The key was not stored, so let a retry generate it
+            idempotency_store.release(claimed_idempotency_key)
 
 @app.post("/verify-key") 
 async def verify_activation_key(request: VerifyKeyRequest):
@@ -155,7 +241,9 @@ async def verify_activation_key(request: VerifyKeyRequest):
                 detail="Key manager is not initialized. Server configuration error."
             )
         
-        result = key_manager.verify_activation(
+        # Run the store lookup off the event loop so slow reads don't stall other requests
+        result = await run_in_threadpool(
+            key_manager.verify_activation,
             system_id=request.system_id,
             activation_key=request.activation_key,
             app_name=request.app_name
@@ -173,8 +261,28 @@ async def verify_activation_key(request: VerifyKeyRequest):
 async def get_all_activation_keys():
     """
     Get all activation records (for admin use)
+    Served from the local cache while records changed since the last sync are fetched in the background
     """
     try:
+        if activation_cache and (db or activation_cache.records):
+            if db:
+                if not activation_cache.records and not activation_cache.last_synced_at:
+                    # First launch with nothing on disk, wait for the initial full sync
+                    await run_in_threadpool(activation_cache.sync)
+                else:
+                    activation_cache.start_background_sync()
+            
+            activations = activation_cache.get_activations()
+            return {
+                "success": True,
+                "activations": activations,
+                "count": len(activations),
+                "cache": {
+                    "last_synced_at": activation_cache.last_synced_at.isoformat() if activation_cache.last_synced_at else None,
+                    "syncing": activation_cache.is_syncing()
+                }
+            }
+        
         # Check Firebase connection first
         if not db:
             raise HTTPException(
@@ -188,7 +296,7 @@ async def get_all_activation_keys():
                 detail="Key manager is not initialized. Server configuration error."
             )
         
-        activations = key_manager.get_all_activations()
+        activations = await run_in_threadpool(key_manager.get_all_activations)
         return {
             "success": True,
             "activations": activations,
@@ -207,11 +315,15 @@ async def deactivate_activation_key(activation_key: str = Form(...)):
     Deactivate an activation key
     """
     try:
-        success = key_manager.deactivate_key(activation_key)
+        success = await run_in_threadpool(key_manager.deactivate_key, activation_key)
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to deactivate key")
         
+        # Show the change in the admin list right away, the background sync brings the server copy
+        if activation_cache:
+            activation_cache.record_local_change(activation_key, {"is_active": False})
+        
         return {
             "success": True,
             "message": "Activation key deactivated successfully"
@@ -226,7 +338,7 @@ async def get_customer_statistics(customer_email: str):
     Get statistics for a customer by email - how many apps they have purchased
     """
     try:
-        stats = key_manager.get_customer_statistics(customer_email)
+        stats = await run_in_threadpool(key_manager.get_customer_statistics, customer_email)
         return {
             "success": True,
             "customer_email": customer_email,
@@ -251,7 +363,8 @@ async def health_check():
             "initialized": firebase_status["initialized"],
             "connected": firebase_status["connected"],
             "status": "✅ Connected" if is_healthy else "❌ Disconnected"
-        }
+        },
+        "admission": admission_controller.stats()
     }
     
     # Add error details if Firebase is not working
@@ -278,7 +391,7 @@ async def test_firebase_connection():
         query_result = test_collection.limit(1).stream()
         
         # Try to consume the iterator
-        docs = list(query_result)
+        docs = await run_in_threadpool(list, query_result)
         
         return {
             "success": True,
@@ -0,0 +1,27 @@
+import asyncio
+import os
+import sys
+import types
+
+import pytest
+
+# Backend modules are imported flat, the same way main.py and run_server.py import them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# key_manager connects to Firebase at import time; unit tests stub the store instead
+firebase_config = types.ModuleType("firebase_config")
+firebase_config.db = None
+sys.modules["firebase_config"] = firebase_config
+
+try:
+    import firebase_admin  # noqa: F401
+except ImportError:
+    firebase_admin = types.ModuleType("firebase_admin")
+    firebase_admin.firestore = types.SimpleNamespace(SERVER_TIMESTAMP=object())
+    sys.modules["firebase_admin"] = firebase_admin
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a fresh event loop"""
+    return asyncio.run
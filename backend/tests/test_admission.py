@@ -0,0 +1,151 @@
+import asyncio
+
+from admission import AdmissionController, AdmissionMiddleware, PriorityClass
+
+
+def make_class(name="verification", priority=0, max_concurrent=1, max_queued=1, queue_timeout=1.0):
+    return PriorityClass(name, priority=priority, max_concurrent=max_concurrent, max_queued=max_queued,
+                         queue_timeout=queue_timeout, retry_after=3)
+
+
+def test_admits_up_to_max_concurrent(run):
+    async def scenario():
+        priority_class = make_class(max_concurrent=2)
+        assert await priority_class.acquire(False)
+        assert await priority_class.acquire(False)
+        assert priority_class.active == 2
+
+    run(scenario())
+
+
+def test_release_hands_slot_to_queued_request(run):
+    async def scenario():
+        priority_class = make_class()
+        await priority_class.acquire(False)
+        waiter = asyncio.create_task(priority_class.acquire(False))
+        await asyncio.sleep(0)
+        assert priority_class.waiting == 1
+
+        priority_class.release()
+        assert await waiter
+        assert priority_class.active == 1
+        assert priority_class.queued_total == 1
+
+    run(scenario())
+
+
+def test_sheds_when_queue_is_full(run):
+    async def scenario():
+        priority_class = make_class()
+        await priority_class.acquire(False)
+        waiter = asyncio.create_task(priority_class.acquire(False))
+        await asyncio.sleep(0)
+
+        assert not await priority_class.acquire(False)
+        assert priority_class.shed_total == 1
+        waiter.cancel()
+
+    run(scenario())
+
+
+def test_queue_timeout_sheds_and_removes_waiter(run):
+    async def scenario():
+        priority_class = make_class(queue_timeout=0.01)
+        await priority_class.acquire(False)
+
+        assert not await priority_class.acquire(False)
+        assert priority_class.waiting == 0
+        assert priority_class.shed_total == 1
+
+    run(scenario())
+
+
+def test_cancelled_waiter_does_not_take_a_slot(run):
+    async def scenario():
+        priority_class = make_class()
+        await priority_class.acquire(False)
+        waiter = asyncio.create_task(priority_class.acquire(False))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert priority_class.waiting == 0
+
+        priority_class.release()
+        assert priority_class.active == 0
+
+    run(scenario())
+
+
+def test_waiter_cancelled_after_hand_off_passes_slot_on(run):
+    async def scenario():
+        priority_class = make_class(max_queued=2)
+        await priority_class.acquire(False)
+        first = asyncio.create_task(priority_class.acquire(False))
+        second = asyncio.create_task(priority_class.acquire(False))
+        await asyncio.sleep(0)
+
+        # Slot is handed to the first waiter, which is cancelled before it resumes
+        priority_class.release()
+        first.cancel()
+        (first_result,) = await asyncio.gather(first, return_exceptions=True)
+
+        # Depending on the Python version the waiter either keeps the slot or passes it on, it is never lost
+        if first_result is True:
+            priority_class.release()
+        assert await second
+        assert priority_class.active == 1
+
+    run(scenario())
+
+
+def test_lower_priority_is_shed_while_higher_priority_queues(run):
+    async def scenario():
+        verification = make_class()
+        admin = make_class("admin", priority=2)
+        controller = AdmissionController([verification, admin], [])
+        await verification.acquire(False)
+        waiter = asyncio.create_task(verification.acquire(False))
+        await asyncio.sleep(0)
+
+        assert controller.higher_priority_waiting(admin)
+        assert not controller.higher_priority_waiting(verification)
+        assert not await admin.acquire(controller.higher_priority_waiting(admin))
+        waiter.cancel()
+
+    run(scenario())
+
+
+def test_classify_matches_path_prefixes():
+    controller = AdmissionController(
+        [make_class(), make_class("admin", priority=2)],
+        [("/verify-key", "verification"), ("/customer-stats", "admin")]
+    )
+
+    assert controller.classify("/verify-key").name == "verification"
+    assert controller.classify("/customer-stats/a@b.com").name == "admin"
+    assert controller.classify("/verify-keys") is None
+    assert controller.classify("/health") is None
+
+
+def test_middleware_sheds_with_429_and_retry_after(run):
+    async def scenario():
+        priority_class = make_class(max_queued=0)
+        controller = AdmissionController([priority_class], [("/verify-key", "verification")])
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        middleware = AdmissionMiddleware(app, controller)
+        await priority_class.acquire(False)
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await middleware({"type": "http", "path": "/verify-key"}, None, send)
+        assert messages[0]["status"] == 429
+        assert (b"retry-after", b"3") in messages[0]["headers"]
+
+    run(scenario())
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from idempotency import IdempotencyStore
+
+FINGERPRINT = IdempotencyStore.fingerprint({"system_id": "SYSTEM-1", "app_name": "wa-bomb"})
+
+
+def test_replay_returns_stored_response_without_a_second_store(run):
+    async def scenario():
+        store = IdempotencyStore()
+        writes = []
+
+        async def generate():
+            cached = await store.claim("key-1", FINGERPRINT)
+            if cached is not None:
+                return cached
+            writes.append(1)
+            response = {"activation_key": f"KEY-{len(writes)}"}
+            store.complete("key-1", FINGERPRINT, response)
+            return response
+
+        first = await generate()
+        assert await generate() == first
+        assert len(writes) == 1
+
+    run(scenario())
+
+
+def test_mismatched_payload_raises(run):
+    async def scenario():
+        store = IdempotencyStore()
+        await store.claim("key-1", FINGERPRINT)
+        store.complete("key-1", FINGERPRINT, {"activation_key": "KEY-1"})
+
+        with pytest.raises(ValueError):
+            await store.claim("key-1", IdempotencyStore.fingerprint({"system_id": "SYSTEM-2"}))
+
+    run(scenario())
+
+
+def test_concurrent_retry_waits_for_pending_request(run):
+    async def scenario():
+        store = IdempotencyStore()
+        assert await store.claim("key-1", FINGERPRINT) is None
+
+        retry = asyncio.create_task(store.claim("key-1", FINGERPRINT))
+        await asyncio.sleep(0)
+        assert not retry.done()
+
+        store.complete("key-1", FINGERPRINT, {"activation_key": "KEY-1"})
+        assert await retry == {"activation_key": "KEY-1"}
+
+    run(scenario())
+
+
+def test_release_lets_a_retry_take_over(run):
+    async def scenario():
+        store = IdempotencyStore()
+        assert await store.claim("key-1", FINGERPRINT) is None
+
+        retry = asyncio.create_task(store.claim("key-1", FINGERPRINT))
+        await asyncio.sleep(0)
+
+        # Original request failed to store its key
+        store.release("key-1")
+        assert await retry is None
+
+    run(scenario())
+
+
+def test_expired_response_is_not_replayed(run, monkeypatch):
+    async def scenario():
+        now = [1000.0]
+        monkeypatch.setattr("idempotency.time.monotonic", lambda: now[0])
+        store = IdempotencyStore(ttl_seconds=60)
+        await store.claim("key-1", FINGERPRINT)
+        store.complete("key-1", FINGERPRINT, {"activation_key": "KEY-1"})
+
+        now[0] += 61
+        assert await store.claim("key-1", FINGERPRINT) is None
+
+    run(scenario())
+
+
+def test_oldest_response_is_evicted_beyond_max_entries(run):
+    async def scenario():
+        store = IdempotencyStore(max_entries=2)
+        for key in ("key-1", "key-2", "key-3"):
+            await store.claim(key, FINGERPRINT)
+            store.complete(key, FINGERPRINT, {"activation_key": key})
+
+        assert await store.claim("key-1", FINGERPRINT) is None
+        assert await store.claim("key-3", FINGERPRINT) == {"activation_key": "key-3"}
+
+    run(scenario())
@@ -0,0 +1,42 @@
+from key_filter import BloomFilter
+
+
+def test_no_false_negatives():
+    bloom = BloomFilter(capacity=1000)
+    keys = [f"{i:04X}-AAAA-BBBB-CCCC" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(bloom.might_contain(key) for key in keys)
+
+
+def test_false_positive_rate_stays_near_target():
+    bloom = BloomFilter(capacity=1000, false_positive_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"present-{i}")
+
+    false_positives = sum(bloom.might_contain(f"absent-{i}") for i in range(10000))
+    assert false_positives < 300
+
+
+def test_empty_filter_contains_nothing():
+    assert not BloomFilter(capacity=10).might_contain("AAAA-BBBB-CCCC-DDDD")
+
+
+def test_repeat_add_does_not_count():
+    bloom = BloomFilter(capacity=100)
+
+    assert bloom.add("AAAA-BBBB-CCCC-DDDD")
+    assert not bloom.add("AAAA-BBBB-CCCC-DDDD")
+    assert bloom.count == 1
+
+
+def test_over_capacity():
+    bloom = BloomFilter(capacity=100)
+    for i in range(100):
+        bloom.add(f"key-{i}")
+    assert not bloom.is_over_capacity()
+
+    for i in range(100, 110):
+        bloom.add(f"key-{i}")
+    assert bloom.is_over_capacity()
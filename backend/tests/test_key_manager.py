@@ -0,0 +1,80 @@
+from key_manager import ActivationKeyManager
+
+
+class StubbedStoreKeyManager(ActivationKeyManager):
+    """Serves get_activations_changed_since from a list instead of Firestore"""
+
+    def __init__(self, keys):
+        super().__init__()
+        self.keys = keys
+        self.fail_queries = False
+        self.store_queries = 0
+
+    def get_activations_changed_since(self, since=None, fields=None):
+        self.store_queries += 1
+        if self.fail_queries:
+            return None
+        return [{"activation_key": key} for key in self.keys]
+
+
+def test_generated_key_has_valid_checksum():
+    key = ActivationKeyManager().generate_activation_key("SYSTEM-1", "wa-bomb")
+
+    assert len(key.split("-")) == 5
+    assert not ActivationKeyManager.has_invalid_checksum(key)
+
+
+def test_tampered_key_has_invalid_checksum():
+    key = ActivationKeyManager().generate_activation_key("SYSTEM-1", "mail-storm")
+    tampered = ("1" if key[0] != "1" else "2") + key[1:]
+
+    assert ActivationKeyManager.has_invalid_checksum(tampered)
+
+
+def test_legacy_key_without_checksum_is_not_rejected():
+    assert not ActivationKeyManager.has_invalid_checksum("1A2B-3C4D-5E6F-7A8B")
+
+
+def test_refresh_picks_up_keys_from_other_servers():
+    manager = StubbedStoreKeyManager(["1A2B-3C4D-5E6F-7A8B"])
+    manager.refresh_key_filter()
+
+    # Written by another server after the filter was built
+    manager.keys.append("9F8E-7D6C-5B4A-3928")
+    assert not manager.might_exist("9F8E-7D6C-5B4A-3928")
+
+    manager.refresh_key_filter()
+    assert manager.might_exist("9F8E-7D6C-5B4A-3928")
+
+
+def test_misses_are_answered_without_store_queries():
+    manager = StubbedStoreKeyManager(["1A2B-3C4D-5E6F-7A8B"])
+    manager.rebuild_key_filter()
+    queries_after_rebuild = manager.store_queries
+
+    rejected = sum(not manager.might_exist(f"{i:04X}-0000-0000-0000") for i in range(10000))
+    assert rejected > 9900
+    assert manager.store_queries == queries_after_rebuild
+
+
+def test_refreshing_known_keys_does_not_fill_the_filter():
+    manager = StubbedStoreKeyManager([f"{i:04X}-AAAA-BBBB-CCCC" for i in range(100)])
+    manager.rebuild_key_filter()
+    key_filter = manager.key_filter
+    count = key_filter.count
+
+    for _ in range(200):
+        manager.refresh_key_filter()
+
+    # Same filter object means no full rebuild was triggered
+    assert manager.key_filter is key_filter
+    assert key_filter.count == count
+
+
+def test_might_exist_falls_through_before_filter_is_built():
+    manager = StubbedStoreKeyManager(["1A2B-3C4D-5E6F-7A8B"])
+    manager.fail_queries = True
+    manager.refresh_key_filter()
+
+    assert manager.key_filter is None
+    assert manager.might_exist("0000-0000-0000-0000")
@@ -0,0 +1,105 @@
+import os
+from datetime import datetime, timezone
+
+from key_manager import ActivationKeyManager
+from local_cache import LocalActivationCache
+
+EARLIER = datetime(2026, 1, 1, tzinfo=timezone.utc)
+LATER = datetime(2026, 2, 1, tzinfo=timezone.utc)
+
+
+class StubbedKeyManager:
+    """Returns queued batches of changed records instead of querying Firestore"""
+
+    latest_updated_at = staticmethod(ActivationKeyManager.latest_updated_at)
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.since_calls = []
+        self.backfilled = []
+
+    def get_activations_changed_since(self, since=None):
+        self.since_calls.append(since)
+        return self.batches.pop(0) if self.batches else []
+
+    def backfill_updated_at(self, activation_keys):
+        self.backfilled.extend(activation_keys)
+        return True
+
+
+def make_cache(tmp_path, key_manager):
+    return LocalActivationCache(key_manager, cache_path=str(tmp_path / "cache" / "activations.json"))
+
+
+def test_first_sync_fetches_everything(tmp_path):
+    key_manager = StubbedKeyManager([
+        {"activation_key": "A", "is_active": True, "updated_at": EARLIER},
+        {"activation_key": "B", "is_active": True, "updated_at": LATER},
+    ])
+    cache = make_cache(tmp_path, key_manager)
+
+    assert cache.sync()
+    assert key_manager.since_calls == [None]
+    assert {record["activation_key"] for record in cache.get_activations()} == {"A", "B"}
+    assert cache.watermark == LATER
+
+
+def test_delta_sync_merges_changed_records(tmp_path):
+    key_manager = StubbedKeyManager(
+        [{"activation_key": "A", "is_active": True, "updated_at": EARLIER},
+         {"activation_key": "B", "is_active": True, "updated_at": EARLIER}],
+        [{"activation_key": "B", "is_active": False, "updated_at": LATER}],
+    )
+    cache = make_cache(tmp_path, key_manager)
+    cache.sync()
+    cache.sync()
+
+    assert key_manager.since_calls == [None, EARLIER]
+    assert cache.records["A"]["is_active"] is True
+    assert cache.records["B"]["is_active"] is False
+    assert cache.watermark == LATER
+
+
+def test_watermark_only_advances_on_server_updated_at(tmp_path):
+    key_manager = StubbedKeyManager([{"activation_key": "LEGACY", "is_active": True}])
+    cache = make_cache(tmp_path, key_manager)
+    cache.sync()
+
+    assert cache.watermark is None
+    assert key_manager.backfilled == ["LEGACY"]
+
+
+def test_snapshot_round_trips_through_disk(tmp_path):
+    key_manager = StubbedKeyManager([
+        {"activation_key": "A", "is_active": True, "created_at": EARLIER, "updated_at": LATER},
+    ])
+    cache = make_cache(tmp_path, key_manager)
+    cache.sync()
+
+    reloaded = make_cache(tmp_path, StubbedKeyManager())
+    assert reloaded.load()
+    assert reloaded.records == cache.records
+    assert reloaded.records["A"]["created_at"] == EARLIER.isoformat()
+    assert reloaded.watermark == LATER
+    assert not os.path.exists(cache.cache_path + ".tmp")
+
+
+def test_unchanged_sync_does_not_rewrite_snapshot(tmp_path):
+    record = {"activation_key": "A", "is_active": True, "updated_at": LATER}
+    cache = make_cache(tmp_path, StubbedKeyManager([record], [record]))
+    cache.sync()
+    os.remove(cache.cache_path)
+
+    cache.sync()
+    assert not os.path.exists(cache.cache_path)
+
+
+def test_local_change_is_visible_before_next_sync(tmp_path):
+    cache = make_cache(tmp_path, StubbedKeyManager([
+        {"activation_key": "A", "is_active": True, "updated_at": LATER},
+    ]))
+    cache.sync()
+
+    cache.record_local_change("A", {"is_active": False})
+    assert cache.records["A"]["is_active"] is False
+    assert cache.watermark == LATER